@@ -123,6 +123,30 @@ COAP_SERVER_ERROR_GATEWAY_TIMEOUT = const(164) #5.04
 COAP_SERVER_ERROR_PROXYING_NOT_SUPPORTED = const(165) #5.05
 #COAP message formats
 COAP_PAYLOAD_MARKER = const(0xFF)
+#precompiled header formats
+try:
+    _Struct = struct.Struct
+except AttributeError:
+    #ustruct has no Struct class - bind the format string once instead
+    class _Struct(object):
+        def __init__(self, fmt):
+            self.format = fmt
+            self.size = struct.calcsize(fmt)
+
+        def pack(self, *values):
+            return struct.pack(self.format, *values)
+
+        def pack_into(self, buffer, offset, *values):
+            struct.pack_into(self.format, buffer, offset, *values)
+
+        def unpack_from(self, buffer, offset=0):
+            return struct.unpack_from(self.format, buffer, offset)
+
+_HDR = _Struct('!BBH')
+_U8 = _Struct('!B')
+_U16 = _Struct('!H')
+#extended option delta/length writers, indexed by their size in bytes
+_EXT = (None, _U8, _U16)
 #COAP errors
 class CoapMessageFormatError(Exception):
     pass
@@ -138,6 +162,12 @@ class CoapContentFormatError(Exception):
 
 class CoapBadOptionError(Exception):
     pass
+
+def _enc_delta(d):
+    #split an option delta or length into (nibble, extended value, extended bytes)
+    if d > 65804:
+        raise CoapMessageFormatError('option delta or length too large')
+    return (d, 0, 0) if d < 13 else (13, d - 13, 1) if d < 269 else (14, d - 269, 2)
 #CoAP Resource
 class CoapResource(object):
     def __init__(self, path, server, handle_get, handle_put):
@@ -159,7 +189,7 @@ class CoapResource(object):
 
     def removeChild(self, child):
         self.children.remove(child)
-        self.server.deleteResource(child)
+        self.server.deleteResource(child.path)
 
     def getChildren(self, child):
         return self.children
@@ -186,42 +216,60 @@ class CoapResource(object):
 class WellKnownCore(CoapResource):
     def __init__(self, server):
         super().__init__('.well-known/core', server, None, None)
+        self._payload = None
 
     def get(self, *args, **kwargs):
-        return CoapPayload(self.server.getResourcesInCoRELinkFormat(), 40)
+        #the server keeps the same string until its resources change, so the
+        #payload (and its encoded bytes) can be reused until then
+        links = self.server.getResourcesInCoRELinkFormat()
+        if self._payload is None or self._payload.data is not links:
+            self._payload = CoapPayload(links, COAP_CONTENTFORMAT_APPLICATION_LINKFORMAT)
+        return self._payload
 
 class CoapOption(object):
+    __slots__ = ('number', 'value')
+
     def __init__(self, number, value):
         self.number = number
         self.value = value
 
+    def validate(self):
+        #unknown options are accepted when parsing (elective options may be
+        #ignored), but only registered ones can be encoded
         if not self.number in coapOptionsRegistry:
-            raise CoapUnknownOptionError()
+            raise CoapBadOptionError('option {} is unknown'.format(self.number))
 
     def length(self):
-        if self.type() == COAP_OPTION_TYPE_EMPTY:
+        option_type = self.type()
+        if option_type == COAP_OPTION_TYPE_EMPTY:
             return 0
-        elif self.type() == COAP_OPTION_TYPE_OPAQUE:
+        elif option_type == COAP_OPTION_TYPE_OPAQUE:
             return len(self.value)
-        elif self.type() == COAP_OPTION_TYPE_UINT:
-            #calc minimum number of bytes needed to represent this integer
-            length = 0
+        elif option_type == COAP_OPTION_TYPE_UINT:
+            #minimum number of bytes needed to represent this integer
+            #(int.bit_length is not available on micropython, uint options
+            #are at most 4 bytes long anyway)
             int_val = int(self.value)
-            while int_val:
-                int_val >>= 8
-                length += 1
-            if length > 4:
-                #unzulässig
-                pass
-            return length
-        elif self.type() == COAP_OPTION_TYPE_STRING:
+            if int_val < 0x100:
+                return 1 if int_val else 0
+            elif int_val < 0x10000:
+                return 2
+            elif int_val < 0x1000000:
+                return 3
+            else:
+                return 4
+        elif option_type == COAP_OPTION_TYPE_STRING:
             return len(bytes(self.value, 'utf-8'))
 
     def type(self):
         return coapOptionsRegistry[self.number]['type']
 
+    def as_uint(self):
+        #uint option values arrive as big-endian bytes
+        return int.from_bytes(self.value, 'big')
+
     def is_critical(self):
-        return bool(self.value & 1)
+        return bool(self.number & 1)
 
     def is_unsafe(self):
         return bool(self.number & 2)
@@ -235,23 +283,26 @@ class CoapPayload(object):
     def __init__(self, payload, content_format):
         self.data = payload
         self.content_format = content_format
+        #serialized data, filled in by CoapMessage.to_bytes
+        self._encoded = None
 
 #CoAP Message
 class CoapMessage(object):
     @classmethod
     def deserialize(cls, dgram):
         msg = cls()
-        datagram = dgram
+        #slices of a memoryview are views, not copies
+        datagram = memoryview(dgram)
         dgram_len = len(datagram)
         pos = 0
         running_delta = 0
-        datagram_deserialization_complete = False
 
         if dgram_len < 4:
             #Header must have at least 4 bytes
             raise CoapMessageFormatError('CoAP message has a length of less than 4 bytes')
-        elif dgram_len == 4 and struct.unpack_from('!B', datagram, 2)[0] == 0:
-            header = struct.unpack_from('!BBH', datagram, pos)
+        elif dgram_len == 4 and datagram[1] == 0:
+            #code 0.00 - empty message
+            header = _HDR.unpack_from(datagram, pos)
             pos += 4
 
             msg.ver = (header[0] & 0b11000000) >> 6
@@ -265,7 +316,7 @@ class CoapMessage(object):
 
             return CoapEmpty(msg)
         elif dgram_len > 4:
-            header = struct.unpack_from('!BBH', datagram, pos)
+            header = _HDR.unpack_from(datagram, pos)
             pos += 4
 
             msg.ver = (header[0] & 0b11000000) >> 6
@@ -280,63 +331,65 @@ class CoapMessage(object):
             msg.mid = header[2]
 
             if msg.tkl > 0:
-                fmt = '!{0}s'.format(msg.tkl)
-                msg.token = struct.unpack_from(fmt, datagram, pos)[0]
+                if pos + msg.tkl > dgram_len:
+                    raise CoapMessageFormatError('Token too short')
+                msg.token = bytes(datagram[pos:pos + msg.tkl])
                 pos += msg.tkl
 
-            while not datagram_deserialization_complete:
-                try:
-                    next_byte = struct.unpack_from('!B', datagram, pos)
-                    pos += 1
-                except:
-                    #print('Ende erreicht')
-                    datagram_deserialization_complete = True
+            while pos < dgram_len:
+                next_byte = datagram[pos]
+                pos += 1
+
+                if next_byte == COAP_PAYLOAD_MARKER:
+                    if pos == dgram_len:
+                        raise CoapMessageFormatError('Payload too short')
+                    msg.payload = bytes(datagram[pos:])
                     break
 
-                if next_byte != COAP_PAYLOAD_MARKER:
-                    option_header = next_byte
-                    option_delta = (option_header[0] & 0xF0) >> 4
-                    option_length = option_header[0] & 0x0F
-
-                    if option_delta == 13:
-                        delta = struct.unpack_from('!B', datagram, pos)[0] + 13
-                        pos += 1
-                    elif option_delta == 14:
-                        delta = struct.unpack_from('!B', datagram, pos)[0] + 269
-                        pos += 1
-                    elif option_delta == 15:
-                        raise CoapMessageFormatError('option number must not be 15')
-                    else:
-                        delta = option_delta
-
-                    option_number = delta + running_delta
-                    running_delta += delta
-
-                    if option_length == 13:
-                        length = struct.unpack_from('!B', datagram, pos)[0] + 13
-                        pos += 1
-                    elif option_length == 14:
-                        length = struct.unpack_from('!B', datagram, pos)[0] + 269
-                        pos += 1
-                    elif option_length == 15:
-                        raise CoapMessageFormatError('option length must not be 15')
-                    else:
-                        length = option_length
+                option_delta = (next_byte & 0xF0) >> 4
+                option_length = next_byte & 0x0F
+
+                if option_delta < 13:
+                    delta = option_delta
+                elif option_delta == 13:
+                    if pos + 1 > dgram_len:
+                        raise CoapMessageFormatError('option header too short')
+                    delta = datagram[pos] + 13
+                    pos += 1
+                elif option_delta == 14:
+                    if pos + 2 > dgram_len:
+                        raise CoapMessageFormatError('option header too short')
+                    delta = ((datagram[pos] << 8) | datagram[pos + 1]) + 269
+                    pos += 2
+                else:
+                    raise CoapMessageFormatError('option number must not be 15')
 
-                    fmt = '!{0}s'.format(length)
-                    option_value = struct.unpack_from(fmt, datagram, pos)[0]
-                    pos += length
+                option_number = delta + running_delta
+                running_delta += delta
 
-                    msg.options.append(CoapOption(option_number, option_value))
+                if option_length < 13:
+                    length = option_length
+                elif option_length == 13:
+                    if pos + 1 > dgram_len:
+                        raise CoapMessageFormatError('option header too short')
+                    length = datagram[pos] + 13
+                    pos += 1
+                elif option_length == 14:
+                    if pos + 2 > dgram_len:
+                        raise CoapMessageFormatError('option header too short')
+                    length = ((datagram[pos] << 8) | datagram[pos + 1]) + 269
+                    pos += 2
                 else:
-                    try:
-                        fmt = '!{0}s'.format(dgram_len - pos)
-                        msg.payload = struct.unpack_from(fmt, datagram, pos)
-                        datagram_deserialization_complete = True
-                    except:
-                        raise CoapMessageFormatError('Payload too short')
-            else:
-                raise CoapMessageFormatError('non-empty message has only 4 bytes length')
+                    raise CoapMessageFormatError('option length must not be 15')
+
+                if pos + length > dgram_len:
+                    raise CoapMessageFormatError('option value too short')
+                option_value = bytes(datagram[pos:pos + length])
+                pos += length
+
+                msg.options.append(CoapOption(option_number, option_value))
+        else:
+            raise CoapMessageFormatError('non-empty message has only 4 bytes length')
 
         return CoapRequest(msg)
 
@@ -371,93 +424,77 @@ class CoapMessage(object):
 
         self.payload = None
 
-    def to_bytes(self, content_format=COAP_CONTENTFORMAT_TEXT_PLAIN):
-        values = []
-        fmt = '!BBH'
-        values.append((self.ver << 6) | (self.t << 4) | self.tkl)
-        values.append(self.code)
-        values.append(self.mid)
+    def to_bytes(self):
+        data = None
+        payload = self.payload
+        if payload:
+            data = payload._encoded
+            if data is None:
+                content_format = payload.content_format
+                if content_format in (COAP_CONTENTFORMAT_TEXT_PLAIN, COAP_CONTENTFORMAT_APPLICATION_LINKFORMAT, COAP_CONTENTFORMAT_APPLICATION_XML):
+                    data = payload.data if isinstance(payload.data, bytes) else str(payload.data).encode('utf-8')
+                elif content_format == COAP_CONTENTFORMAT_APPLICATION_JSON:
+                    data = json.dumps(payload.data).encode('utf-8')
+                elif content_format == COAP_CONTENTFORMAT_APPLICATION_OCTET_STREAM:
+                    data = payload.data
+                elif content_format == COAP_CONTENTFORMAT_APPLICATION_EXI:
+                    raise CoapContentFormatError('content format exi is not supported')
+                else:
+                    raise CoapContentFormatError('content format {} is unknown'.format(content_format))
+                payload._encoded = data
+
+        #upper bound: header, token, per option 1 byte header + up to
+        #2+2 bytes extended delta/length + value, payload marker + payload
+        option_lengths = [option.length() for option in self.options]
+        size = 4 + self.tkl + sum(option_lengths) + 5 * len(option_lengths)
+        if data:
+            size += 1 + len(data)
+        buf = bytearray(size)
+
+        _HDR.pack_into(buf, 0, (self.ver << 6) | (self.t << 4) | self.tkl, self.code, self.mid)
+        pos = 4
         if self.token:
-            fmt += '{0}s'.format(self.tkl)
-            values.append(self.token)
+            buf[pos:pos + self.tkl] = self.token
+            pos += self.tkl
         if self.options:
             running_delta = 0
-            for option in self.options:
+            for option, option_length in zip(self.options, option_lengths):
                 option_number = option.number
                 option_value = option.value
                 option_delta = option_number - running_delta
-                option_length = option.length()
-
-                if option_delta < 13:
-                    fmt += 'B'
-                    delta = option_delta
-                    ext_delta = 0
-                elif 12 < option_delta < 269:
-                    fmt += 'BB'
-                    delta = 13
-                    ext_delta = option_delta - 13
-                elif 268 < option_delta:
-                    fmt += 'BB'
-                    delta = 14
-                    ext_delta = option_delta - 269
-                else:
-                    raise CoapMessageFormatError('option number too high')
-                running_delta += option_number
 
-                if option_length < 13:
-                    length = option_length
-                    ext_length = 0
-                elif 12 < option_length < 269:
-                    fmt += 'B'
-                    length = 13
-                    ext_length = option_length - 13
-                elif 268 < option_length:
-                    fmt += 'B'
-                    length = 14
-                    ext_length = option_length - 269
-                else:
-                    raise CoapMessageFormatError('option length too long')
+                delta, ext_delta, ext_delta_bytes = _enc_delta(option_delta)
+                length, ext_length, ext_length_bytes = _enc_delta(option_length)
+                running_delta = option_number
 
-                values.append((delta << 4) | length)
+                _U8.pack_into(buf, pos, (delta << 4) | length)
+                pos += 1
 
-                if ext_delta:
-                    values.append(ext_delta)
-                if ext_length:
-                    values.append(ext_length)
+                if ext_delta_bytes:
+                    _EXT[ext_delta_bytes].pack_into(buf, pos, ext_delta)
+                    pos += ext_delta_bytes
+                if ext_length_bytes:
+                    _EXT[ext_length_bytes].pack_into(buf, pos, ext_length)
+                    pos += ext_length_bytes
                 if option_value and option_length:
-                    if option.type() == COAP_OPTION_TYPE_OPAQUE:
-                        fmt += '{0}B'.format(option_length)
-                        values.append(option_value)
-                    elif option.type() == COAP_OPTION_TYPE_UINT:
-                        fmt += '{0}B'.format(option_length)
-                        values.append(option_value)
-                    elif option.type() == COAP_OPTION_TYPE:
-                        fmt += '{0}s'.format(option_length)
-                        values.append(bytes(str(option_value), 'utf-8'))
+                    option_type = option.type()
+                    if option_type == COAP_OPTION_TYPE_OPAQUE:
+                        buf[pos:pos + option_length] = option_value
+                    elif option_type == COAP_OPTION_TYPE_UINT:
+                        buf[pos:pos + option_length] = int(option_value).to_bytes(option_length, 'big')
+                    elif option_type == COAP_OPTION_TYPE_STRING:
+                        buf[pos:pos + option_length] = bytes(str(option_value), 'utf-8')
                     else:
                         pass
+                    pos += option_length
 
-        if self.payload:
-            fmt += 'B'
-            values.append(COAP_PAYLOAD_MARKER)
-            if content_format == COAP_CONTENTFORMAT_TEXT_PLAIN:
-                data = str(self.payload).encode('utf-8')
-            elif content_format == COAP_CONTENTFORMAT_APPLICATION_EXI:
-                raise CoapContentFormatError('content format exi is not supported')
-            elif content_format == COAP_CONTENTFORMAT_APPLICATION_XML:
-                data = str(self.payload).encode('utf-8')
-            elif content_format == COAP_CONTENTFORMAT_APPLICATION_JSON:
-                data = json.dumps(self.payload)
-            elif content_format == COAP_CONTENTFORMAT_APPLICATION_LINKFORMAT:
-                data = str(self.payload).encode('utf-8')
-            elif content_format == COAP_CONTENTFORMAT_APPLICATION_OCTET_STREAM:
-                data = self.payload
-            else:
-                raise CoapContentFormatError('content format {} is unknown'.format(content_format))
-            fmt += '{0}s'.format(len(data))
-            values.append(data)
+        if data:
+            _U8.pack_into(buf, pos, COAP_PAYLOAD_MARKER)
+            pos += 1
+            buf[pos:pos + len(data)] = data
+            pos += len(data)
 
-        return struct.pack(fmt, *values)
+        return bytes(memoryview(buf)[:pos])
 
 class CoapRequest(object):
     def __init__(self, msg):
@@ -469,41 +506,35 @@ class CoapRequest(object):
         self.token = msg.token
         self.options = msg.options
         self.payload = msg.payload
+        self.method_code = msg.code & 0b00011111
 
-    def method(self):
-        return self.code & 0b00011111
+        #index options by number once instead of rescanning per accessor
+        self._opts = {}
+        for option in self.options:
+            self._opts.setdefault(option.number, []).append(option)
 
     def content_format(self):
-        for option in self.options:
-            if option.number == COAP_OPTION_CONTENT_FORMAT:
-                return int(option.value)
-        return False
+        vals = self._opts.get(COAP_OPTION_CONTENT_FORMAT)
+        return vals[0].as_uint() if vals else False
 
     def uri_host(self):
-        for option in self.options:
-            if option.number == COAP_OPTION_URI_HOST:
-                return str(option.value, 'utf-8')
-        return False
+        vals = self._opts.get(COAP_OPTION_URI_HOST)
+        return str(vals[0].value, 'utf-8') if vals else False
 
     def uri_port(self):
-        for option in self.options:
-            if option.number == COAP_OPTION_URI_PORT:
-                return str(option.value, 'utf-8')
-        return False
+        vals = self._opts.get(COAP_OPTION_URI_PORT)
+        return str(vals[0].as_uint()) if vals else False
+
+    def uri_path_options(self):
+        return self._opts.get(COAP_OPTION_URI_PATH, ())
 
     def uri_path(self):
-        paths = []
-        for option in self.options:
-            if option.number == COAP_OPTION_URI_PATH:
-                paths.append(str(option.value, 'utf-8'))
-        return '/'.join(paths)
+        return '/'.join(str(o.value, 'utf-8') for o in self._opts.get(COAP_OPTION_URI_PATH, ()))
 
     def uri_queries(self):
-        queries = []
-        for option in self.options:
-            if option.number == COAP_OPTION_URI_QUERY:
-                queries.append(str(option.value, 'utf-8'))
-        return queries
+        #most requests carry no query, don't build an empty list for them
+        vals = self._opts.get(COAP_OPTION_URI_QUERY)
+        return [str(o.value, 'utf-8') for o in vals] if vals else ()
 
     def url(self):
         prot = 'coap'
@@ -527,8 +558,15 @@ class CoapResponse(object):
         self.payload = None
 
     def add_option(self, option_number, option_value):
-        self.options.append(CoapOption(option_number, option_value))
-        self.options.sort()
+        option = CoapOption(option_number, option_value)
+        option.validate()
+        #keep the list ordered by option number without re-sorting it; options
+        #usually arrive in order, and inserting after equal numbers keeps
+        #repeated options (e.g. Uri-Path segments) in the order they were added
+        i = len(self.options)
+        while i and option_number < self.options[i - 1].number:
+            i -= 1
+        self.options.insert(i, option)
 
     def content_format(self, cf):
         if self.payload:
@@ -542,6 +580,15 @@ class CoapEmpty(object):
         self.code = 0
         self.mid = msg.mid
 
+#node of the server's resource tree, children are keyed by the utf-8
+#encoded path segment so uri-path option values can be looked up as-is
+class _ResourceNode(object):
+    __slots__ = ('children', 'resource')
+
+    def __init__(self):
+        self.children = {}
+        self.resource = None
+
 #CoAP Server
 class CoapServer(object):
     def __init__(self, ip, port=5683):
@@ -549,9 +596,26 @@ class CoapServer(object):
         self.port = port
         self.addr = (self.ip, self.port)
         self.udp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        #receive buffer reused for every datagram, only where the socket
+        #can fill it (micropython sockets have no recvfrom_into)
+        if hasattr(self.udp_sock, 'recvfrom_into'):
+            self._rx_buf = bytearray(1152)
+            self._rx_mv = memoryview(self._rx_buf)
+        else:
+            self._rx_buf = None
+            self._rx_mv = None
 
         self.observers = {}
-        self.resources = {}
+        self.resource_tree = _ResourceNode()
+        #rendered /.well-known/core document, rebuilt after resource changes
+        self._core_link_cache = None
+        #request method code -> handler
+        self._method_handlers = {
+            COAP_METHOD_GET: self._handle_get,
+            COAP_METHOD_PUT: self._handle_put,
+            COAP_METHOD_POST: self._handle_not_implemented,
+            COAP_METHOD_DELETE: self._handle_not_implemented
+        }
 
     def start(self):
         self.addResource(WellKnownCore(self))
@@ -559,47 +623,97 @@ class CoapServer(object):
         self.loop()
 
     def addResource(self, resource):
-        self.resources[resource.path] = resource
+        node = self.resource_tree
+        for segment in resource.path.encode('utf-8').split(b'/'):
+            child = node.children.get(segment)
+            if child is None:
+                child = node.children[segment] = _ResourceNode()
+            node = child
+        node.resource = resource
+        self._core_link_cache = None
 
     def deleteResource(self, uri):
-        self.resources.pop(uri).deleteChildren()
+        #remember the path down so emptied nodes can be pruned afterwards
+        path = []
+        node = self.resource_tree
+        for segment in uri.encode('utf-8').split(b'/'):
+            child = node.children.get(segment)
+            if child is None:
+                raise CoapNotFoundError(uri)
+            path.append((node, segment))
+            node = child
+        if node.resource is None:
+            raise CoapNotFoundError(uri)
+        #children first, while this node still holds its resource and stops
+        #their pruning from climbing past it
+        node.resource.removeChildren()
+        node.resource = None
+        while path and node.resource is None and not node.children:
+            node, segment = path.pop()
+            del node.children[segment]
+        self._core_link_cache = None
 
     def getResource(self, uri):
-        return self.resources[uri]
+        return self._findResource(uri.encode('utf-8').split(b'/'))
 
     def resourceExists(self, uri):
-        return bool(uri in self.resources.keys())
+        node = self._findNode(uri.encode('utf-8').split(b'/'))
+        return node is not None and node.resource is not None
+
+    def _findNode(self, segments):
+        node = self.resource_tree
+        for segment in segments:
+            node = node.children.get(segment)
+            if node is None:
+                return None
+        return node
+
+    def _findResource(self, segments):
+        node = self._findNode(segments)
+        if node is None or node.resource is None:
+            raise CoapNotFoundError()
+        return node.resource
+
+    def _collectResources(self, node, resources):
+        if node.resource is not None:
+            resources.append(node.resource)
+        for child in node.children.values():
+            self._collectResources(child, resources)
+        return resources
 
     def getResourcesInCoRELinkFormat(self):
         #return all resources registered in core link format as specified
         #in rfc6690, section 2.1
-        link_value_list = []
-        for key in self.resources.keys():
+        if self._core_link_cache is None:
             #besser: Objekte in Liste, Pfad abgleichen (Multicast)
-            resource = self.resources[key]
-            link_param_list = []
-
-            if resource.rt:
-                link_param_list.append("rt=\"" + resource.rt + "\"")
-            if resource.if_:
-                link_param_list.append("if=\"" + resource.if_ + "\"")
-            if resource.title:
-                link_param_list.append("title=\"" + resource.title + "\"")
-            if resource.ct:
-                link_param_list.append("ct=" + resource.ct)
-
-            link_params = ';'.join(link_param_list)
-            if link_params:
-                link_value = "<" + resource.path + ">;" + link_params
-            else:
-                link_value = "<" + resource.path + ">"
-            link_value_list.append(link_value)
-        return ','.join(link_value_list)
+            self._core_link_cache = ','.join([self._getLinkValue(resource) for resource in self._collectResources(self.resource_tree, [])])
+        return self._core_link_cache
+
+    def _getLinkValue(self, resource):
+        link_param_list = []
+
+        if resource.rt:
+            link_param_list.append('rt="{}"'.format(resource.rt))
+        if resource.if_:
+            link_param_list.append('if="{}"'.format(resource.if_))
+        if resource.title:
+            link_param_list.append('title="{}"'.format(resource.title))
+        if resource.ct is not None:
+            link_param_list.append('ct={}'.format(resource.ct))
+
+        if link_param_list:
+            return '<{}>;{}'.format(resource.path, ';'.join(link_param_list))
+        else:
+            return '<{}>'.format(resource.path)
 
     def loop(self):
         print('Server started...')
         while True:
-            datagram, addr = self.udp_sock.recvfrom(1152)
+            if self._rx_buf is not None:
+                nbytes, addr = self.udp_sock.recvfrom_into(self._rx_buf)
+                datagram = self._rx_mv[:nbytes]
+            else:
+                datagram, addr = self.udp_sock.recvfrom(1152)
             coap_req = CoapMessage.deserialize(datagram)
 
             coap_resp = self.handle_request(coap_req)
@@ -608,53 +722,54 @@ class CoapServer(object):
             self.send_msg(coap_msg, addr)
 
     def handle_request(self, request):
-        payload = None
-        uri_path = request.uri_path() or None
+        #unrecognized critical options must be rejected, elective ones are
+        #ignored (rfc7252, section 5.4.1)
+        for option in request.options:
+            if option.is_critical() and option.number not in coapOptionsRegistry:
+                return self.make_response(request, CoapPayload('Bad Option', 0), COAP_CLIENT_ERROR_BAD_OPTION)
+
+        uri_path = request.uri_path_options()
         uri_query = request.uri_queries()
         if not uri_path:
             response = self.make_response(request, None, COAP_CLIENT_ERROR_BAD_REQUEST)
             return response
         if uri_query:
-            kwargs = {q.split('=')[0]: q.split('=')[1] for q in uri_query}
+            kwargs = {k: v for k, _, v in (q.partition('=') for q in uri_query)}
         else:
             kwargs = {}
 
-        if request.content_format():
-            content_format = request.content_format()
+        content_format = request.content_format()
+        if content_format:
             kwargs['content_format'] = content_format
 
-        if request.method() == COAP_METHOD_GET:
-            try:
-                payload = self.getResource(uri_path).get(**kwargs)
-                rc = COAP_SUCCESS_CONTENT
-            except CoapNotFoundError:
-                payload = CoapPayload('Not Foundd', 0)
-                rc = COAP_CLIENT_ERROR_NOT_FOUND
-            except:
-                payload = CoapPayload('Internal Server Error', 0)
-                rc = COAP_SERVER_ERROR_INTERNAL_SERVER_ERROR
-        elif request.method() == COAP_METHOD_PUT:
-            try:
-                payload = self.getResource(uri_path).put(**kwargs)
-                rc = COAP_SUCCESS_CREATED
-            except CoapNotFoundError:
-                payload = CoapPayload('Not Foundd', 0)
-                rc = COAP_CLIENT_ERROR_NOT_FOUND
-            except:
-                payload = CoapPayload('Internal Server Error', 0)
-                rc = COAP_SERVER_ERROR_INTERNAL_SERVER_ERROR
-        elif request.method() == COAP_METHOD_POST:
-            payload = CoapPayload('Not Implemented', 0)
-            rc = COAP_SERVER_ERROR_NOT_IMPLEMENTED
-        elif request.method() == COAP_METHOD_DELETE:
-            payload = CoapPayload('Not Implemented', 0)
-            rc = COAP_SERVER_ERROR_NOT_IMPLEMENTED
-        else:
-            payload = CoapPayload('Bad Request', 0)
-            rc = COAP_CLIENT_ERROR_BAD_REQUEST
+        handler = self._method_handlers.get(request.method_code, self._handle_bad_request)
+        payload, rc = handler(uri_path, kwargs)
 
         return self.make_response(request, payload, rc)
 
+    def _handle_get(self, uri_path, kwargs):
+        try:
+            return self._findResource(o.value for o in uri_path).get(**kwargs), COAP_SUCCESS_CONTENT
+        except CoapNotFoundError:
+            return CoapPayload('Not Found', 0), COAP_CLIENT_ERROR_NOT_FOUND
+        except:
+            return CoapPayload('Internal Server Error', 0), COAP_SERVER_ERROR_INTERNAL_SERVER_ERROR
+
+    def _handle_put(self, uri_path, kwargs):
+        try:
+            return self._findResource(o.value for o in uri_path).put(**kwargs), COAP_SUCCESS_CREATED
+        except CoapNotFoundError:
+            return CoapPayload('Not Found', 0), COAP_CLIENT_ERROR_NOT_FOUND
+        except:
+            return CoapPayload('Internal Server Error', 0), COAP_SERVER_ERROR_INTERNAL_SERVER_ERROR
+
+    def _handle_not_implemented(self, uri_path, kwargs):
+        #post and delete are not implemented
+        return CoapPayload('Not Implemented', 0), COAP_SERVER_ERROR_NOT_IMPLEMENTED
+
+    def _handle_bad_request(self, uri_path, kwargs):
+        return CoapPayload('Bad Request', 0), COAP_CLIENT_ERROR_BAD_REQUEST
+
     def make_response(self, request, payload, rc):
         response = CoapResponse()
 
@@ -670,8 +785,9 @@ class CoapServer(object):
         response.mid = request.mid
         response.token = request.token
 
-        response.payload = payload.data
-        response.content_format(payload.content_format)
+        response.payload = payload
+        if payload:
+            response.content_format(payload.content_format)
 
         return response
 